@@ -1,103 +1,313 @@
+import atexit
+import hmac
+import logging
 import os
 import secrets
-from datetime import datetime, timedelta
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 
+import orjson
 from dotenv import load_dotenv
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-from flask_migrate import Migrate
+from flask_migrate import Migrate, upgrade
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt, decode_token
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from sqlalchemy.orm import joinedload
-
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager, joinedload
+from sqlalchemy.pool import QueuePool
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from blocklist import TokenBlocklist
+from chat_writer import ChatWriteBuffer
+from json_provider import OrjsonProvider, SocketIOJSON
 from models import User, Playdate, db, Sport, SportInterest, SportType, Participant, Chat, MessageType
+from query_guard import raise_on_lazy_loads, warn_on_repeated_queries
+from response_cache import NORMAL_TTL, SHORT_TTL, ResponseCache
+from schemas import (JsonSchemaException, validate_user, validate_sport, validate_playdate, validate_playdate_update,
+                     validate_sport_interest, validate_sport_interest_bulk, validate_participant,
+                     validate_participant_bulk, validate_login, validate_chat)
 from sqlite_data import SQLiteSportBuddyDataManager
+from token_cache import DecodedTokenCache
 
 load_dotenv()
 
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
-CORS(app)
-migrate = Migrate(app, db)
+app.json = OrjsonProvider(app)
+# Async mode is auto-detected (eventlet when installed); a message queue such as redis://localhost:6379/0 lets several
+# worker processes share rooms and broadcasts
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=os.getenv("SOCKETIO_ASYNC_MODE") or None,
+                    message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE") or os.getenv("REDIS_URL") or None,
+                    json=SocketIOJSON)
+CORS(app, expose_headers=["X-Next-Cursor"])
 
 # Configuring SQLite database
 basedir = os.path.abspath(os.path.dirname(__file__))
+migrate = Migrate(app, db, directory=os.path.join(basedir, "migrations"))
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(basedir, "data", "sport_buddy.sqlite")}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Request bodies are small JSON documents; reject anything larger before it is buffered
+app.config['MAX_CONTENT_LENGTH'] = 64 * 1024
+# Keep a pool of open SQLite connections instead of reopening the file for every request
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'poolclass': QueuePool,
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+    'connect_args': {'check_same_thread': False}
+}
+
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Enable WAL, relaxed fsync and foreign key enforcement on every new SQLite connection."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    # SQLite ignores REFERENCES unless asked, so deleting a referenced sport would leave orphaned rows behind
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
 
 # Set up JWT configuration
-# app.config["JWT_SECRET_KEY"] = secrets.token_hex(32)
-app.config["JWT_SECRET_KEY"] = os.getenv("jwt-secret-key")
-print(app.config["JWT_SECRET_KEY"])
+# Every worker must sign with the same stable key, or tokens only validate on the worker that issued them.
+# `jwt-secret-key` is the variable name used by existing deployments.
+jwt_secret_key = os.getenv("JWT_SECRET_KEY") or os.getenv("jwt-secret-key")
+if not jwt_secret_key:
+    if os.getenv("FLASK_DEV") != '1':
+        raise RuntimeError("JWT_SECRET_KEY is not set")
+    # A throwaway key is fine for local development; tokens just don't survive a restart
+    jwt_secret_key = secrets.token_hex(32)
+app.config["JWT_SECRET_KEY"] = jwt_secret_key
 app.config['JWT_TOKEN_LOCATION'] = ['headers']
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=8)
 app.config['JWT_BLACKLIST_ENABLED'] = True
 jwt = JWTManager(app)
 
+# Per-event socket and request traces are debug output; only FLASK_DEV=1 turns them on
+app.logger.setLevel(logging.DEBUG if os.getenv("FLASK_DEV") == '1' else logging.INFO)
+
+# Flag N+1 query patterns while developing
+if os.getenv("FLASK_DEV") == '1':
+    warn_on_repeated_queries(app)
+# Stricter: make any relationship a query didn't eager-load raise when accessed
+if os.getenv("RAISE_ON_LAZY_LOAD") == '1':
+    raise_on_lazy_loads(db.session)
+
 # Initialize SQLAlchemy
 db.init_app(app)
 
-# Create the database tables
-with app.app_context():
-    db.create_all()
+# Bump whenever a migration is added, so CREATE_SCHEMA=1 applies it on the next start
+SCHEMA_VERSION = 4
+
+
+def ensure_schema():
+    """Apply the migrations in migrations/ unless the SQLite file's user_version shows they already ran.
+
+    An empty file is built by the migrations as well, so every database reaches the same schema the same way. A
+    failing migration stops startup and leaves the file unstamped, so the next start tries again.
+    """
+    with app.app_context():
+        with db.engine.connect() as connection:
+            if connection.exec_driver_sql("PRAGMA user_version").scalar() >= SCHEMA_VERSION:
+                return
+        upgrade()
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+# Migrate the database only when asked to; deployments run `flask db upgrade` themselves
+if os.getenv('CREATE_SCHEMA') == '1':
+    ensure_schema()
+
+
+def dispose_inherited_connections():
+    """Give a forked worker its own connection pool instead of the SQLite connections opened by its parent."""
+    db.get_engine(app).dispose(close=False)
+
+
+# gunicorn forks its workers after importing the app (e.g. with --preload)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=dispose_inherited_connections)
 
 data_manager = SQLiteSportBuddyDataManager(db)
 
-revoked_tokens = set()
-users = {}
+# Geocoding is network-bound, so it runs on a small thread pool while the request keeps validating
+geocode_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='geocode')
+
+# Revocations are stored in the database so every worker sees them; this is a local cache of the ones seen so far
+revoked_tokens = TokenBlocklist()
+# Socket.IO clients send their token with every event; verify each one once until it expires
+socket_tokens = DecodedTokenCache(decode_token)
+# Claims of the token each Socket.IO connection authenticated with, by sid
+session_claims = {}
+
+chat_writes = ChatWriteBuffer(socketio, app)
+atexit.register(chat_writes.flush)
+
+response_cache = ResponseCache()
+# Socket.IO sessions that joined a room: sid -> (username, room)
+sid_to_user = {}
+
+# Bodies of constant responses, encoded once instead of on every request
+_HOME_BODY = b"Welcome to the Sport Buddy!"
+_USER_NOT_FOUND = orjson.dumps({"message": "User not found!"})
+_SPORT_NOT_FOUND = orjson.dumps({"message": "Sport not found!"})
+_PLAYDATE_NOT_FOUND = orjson.dumps({"message": "Playdate not found!"})
+_CHAT_NOT_FOUND = orjson.dumps({"message": "Chat not found!"})
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+_SPORT_TYPE_VALUES = frozenset(e.value for e in SportType)
+# Passwords stored before hashing was introduced are plain text and don't carry a method prefix
+_PASSWORD_HASH_PREFIXES = ('scrypt:', 'pbkdf2:')
+# Checked against when there's no real hash to check, so every failed login costs the same as a wrong password
+_DUMMY_PASSWORD_HASH = generate_password_hash(secrets.token_hex(16))
+
+
+def paginate(query, model):
+    """Apply keyset pagination from ?after=<id>&limit=<n> and return (rows, next_cursor)."""
+    after = request.args.get('after', default=0, type=int)
+    limit = request.args.get('limit', default=DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    rows = query.filter(model.id > after).order_by(model.id).limit(limit).all()
+    # A full page means there may be more rows after the last one
+    next_cursor = rows[-1].id if len(rows) == limit else None
+    return rows, next_cursor
+
+
+def with_next_cursor(response, next_cursor):
+    """Expose the cursor of the next page in the X-Next-Cursor header."""
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+
+def static_response(body, status=200, mimetype='application/json'):
+    """Wrap pre-encoded bytes in a fresh response (after_request hooks mutate responses, so they can't be shared)."""
+    return app.response_class(body, status=status, mimetype=mimetype)
+
+
+def run_cpu_bound(func, *args):
+    """Call func on a native thread when running under eventlet, so a slow hash doesn't stall every other client."""
+    if socketio.async_mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(func, *args)
+    return func(*args)
+
+
+def hash_password(password):
+    """Hash a password with werkzeug's default (scrypt) off the event loop."""
+    return run_cpu_bound(generate_password_hash, password)
+
+
+def verify_password(user_id, stored_password, password):
+    """Check a password against a user's stored hash, upgrading a legacy plain-text password on success."""
+    if stored_password.startswith(_PASSWORD_HASH_PREFIXES):
+        return run_cpu_bound(check_password_hash, stored_password, password)
+
+    if not hmac.compare_digest(stored_password.encode(), password.encode()):
+        run_cpu_bound(check_password_hash, _DUMMY_PASSWORD_HASH, password)
+        return False
+    db.session.query(User).filter(User.id == user_id) \
+        .update({User.password: hash_password(password)}, synchronize_session=False)
+    db.session.commit()
+    return True
+
+
+def parse_dmy_datetime(value):
+    """Parse a 'DD-MM-YYYY HH:MM:SS' string without going through strptime."""
+    if len(value) != 19 or value[2] != '-' or value[5] != '-' or value[10] != ' ' \
+            or value[13] != ':' or value[16] != ':':
+        raise ValueError(f"Invalid date format: {value!r}")
+    return datetime(int(value[6:10]), int(value[3:5]), int(value[0:2]),
+                    int(value[11:13]), int(value[14:16]), int(value[17:19]))
+
+
+def parse_request_datetime(value):
+    """Parse a request date given as 'DD-MM-YYYY HH:MM:SS' or as ISO-8601, returning naive UTC for the latter."""
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid date format: {value!r}")
+    try:
+        return parse_dmy_datetime(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value[:-1] if value.endswith('Z') else value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@app.after_request
+def invalidate_cached_responses(response):
+    """A successful write to a collection drops the cached GET responses under it."""
+    if request.method in ('POST', 'PUT', 'DELETE') and response.status_code < 400:
+        response_cache.invalidate('/' + request.path.split('/')[1])
+    return response
 
 
 @app.route('/')
 def home():
-    return "Welcome to the Sport Buddy!"
+    return static_response(_HOME_BODY, mimetype='text/plain')
 
 
 # Endpoint to create a new user
 @app.route('/users', methods=['POST'])
 def add_user():
-    data = request.get_json()
+    data = request.get_json(cache=False, silent=True) or {}
 
-    required_fields = ('username', 'first_name', 'last_name', 'email', 'password')
-    if not all(field in data and data[field] for field in required_fields):
-        return jsonify({'error': 'Missing or empty required fields'}), 400
+    try:
+        validate_user(data)
+    except JsonSchemaException as e:
+        return jsonify({'error': e.message}), 400
 
     username = data.get('username')
     first_name = data.get('first_name')
     last_name = data.get('last_name')
     email = data.get('email')
-    password = data.get('password')
+    password = hash_password(data.get('password'))
 
-    new_user = User(username=username, first_name=first_name, last_name=last_name, email=email, password=password)
-    data_manager.add_user(new_user)
+    new_user = dict(username=username, first_name=first_name, last_name=last_name, email=email, password=password)
+    try:
+        data_manager.add_user(new_user)
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Username or email is already in use"}), 409
 
     return jsonify({"message": "User created successfully!"}), 201
 
 
 @app.route('/sports', methods=['POST'])
 def add_sport():
-    data = request.get_json()
+    data = request.get_json(cache=False, silent=True) or {}
 
-    if not data.get('sport_name'):
-        return jsonify({'error': 'Sport name is required'}), 400
-    if 'sport_type' in data and data['sport_type'] not in [e.value for e in SportType]:
-        return jsonify({'error': 'Invalid sport type'}), 400
+    try:
+        validate_sport(data)
+    except JsonSchemaException as e:
+        return jsonify({'error': e.message}), 400
 
     try:
         sport_type = SportType[data['sport_type'].upper()] if 'sport_type' in data else SportType.BOTH
 
-        new_sport = Sport(
-            sport_name=data['sport_name'],
-            sport_type=sport_type
-        )
-
-        db.session.add(new_sport)
-        db.session.commit()
+        sport_id = data_manager.add_sport(dict(sport_name=data['sport_name'], sport_type=sport_type))
 
         return jsonify({
-            'id': new_sport.id,
-            'sport_name': new_sport.sport_name,
-            'sport_type': new_sport.sport_type.value
+            'id': sport_id,
+            'sport_name': data['sport_name'],
+            'sport_type': sport_type.value
         }), 201
 
     except Exception as e:
@@ -107,23 +317,26 @@ def add_sport():
 
 # Endpoint to get all users
 @app.route('/users', methods=['GET'])
+@response_cache.cached(NORMAL_TTL)
 def get_users():
-    users = data_manager.get_all_users()
-    users_data = [{"id": user.id, "username": user.username, "first_name": user.first_name, "last_name": user.last_name}
-                  for user in users]
-    return jsonify(users_data)
+    # Select only the public columns; plain rows skip building User objects
+    users, next_cursor = paginate(db.session.query(User.id, User.username, User.first_name, User.last_name), User)
+    users_data = [user._asdict() for user in users]
+    return with_next_cursor(jsonify(users_data), next_cursor)
 
 
 @app.route('/sports', methods=['GET'])
+@response_cache.cached(NORMAL_TTL)
 def get_sports():
-    sports = data_manager.get_all_sports()
+    sports, next_cursor = paginate(db.session.query(Sport.id, Sport.sport_name, Sport.sport_type), Sport)
     sports_data = [{"id": sport.id, "sport_name": sport.sport_name, 'sport_type': sport.sport_type.value}
                    for sport in sports]
-    return jsonify(sports_data)
+    return with_next_cursor(jsonify(sports_data), next_cursor)
 
 
 # Endpoint to get a user's details by ID
 @app.route('/users/<int:user_id>', methods=['GET'])
+@response_cache.cached(SHORT_TTL)
 def get_user(user_id):
     user = data_manager.get_user_by_id(user_id)
     if user:
@@ -135,26 +348,44 @@ def get_user(user_id):
             "email": user.email
         }
         return jsonify(user_data)
-    return jsonify({"message": "User not found!"}), 404
+    return static_response(_USER_NOT_FOUND, 404)
 
 
 # Endpoint to create a playdate (event)
 @app.route('/playdates', methods=['POST'])
 def add_playdate():
-    data = request.get_json()
+    data = request.get_json(cache=False, silent=True) or {}
 
-    # Ensure all required fields are present
-    if not all(k in data for k in ('title', 'sport_id', 'creator_id', 'address', 'date')):
-        return jsonify({'error': 'Missing required fields'}), 400
+    # Ensure all required fields are present and well-typed
+    try:
+        validate_playdate(data)
+    except JsonSchemaException as e:
+        return jsonify({'error': e.message}), 400
+
+    coordinates = geocode_executor.submit(data_manager.get_location_coordinates, data['address'])
 
     try:
-        latitude, longitude = data_manager.get_location_coordinates(data['address'])
+        playdate_date = parse_request_datetime(data['date'])
+    except (TypeError, ValueError):
+        coordinates.cancel()
+        return jsonify({'error': 'Invalid date format'}), 400
+
+    # Checked while the address is geocoded; with foreign keys enforced a bad id would only fail at the INSERT
+    sport_id, creator_id = db.session.query(
+        db.session.query(Sport.id).filter(Sport.id == data['sport_id']).scalar_subquery(),
+        db.session.query(User.id).filter(User.id == data['creator_id']).scalar_subquery()
+    ).one()
+    if sport_id is None or creator_id is None:
+        coordinates.cancel()
+        return jsonify({'error': 'Sport or creator not found!'}), 404
+
+    try:
+        latitude, longitude = coordinates.result()
         if latitude is None or longitude is None:
             return jsonify({'error': 'Unable to fetch coordinates for the address'}), 400
-        playdate_date = datetime.strptime(data['date'], '%d-%m-%Y %H:%M:%S')
 
         # Create a new playdate
-        new_playdate = Playdate(
+        new_playdate = dict(
             title=data['title'],
             sport_id=data['sport_id'],
             creator_id=data['creator_id'],
@@ -165,22 +396,17 @@ def add_playdate():
             max_participants=data.get('max_participants')
         )
 
-        # Add to the session and commit to the database
-        db.session.add(new_playdate)
-        db.session.commit()
+        # Insert through Core and commit, skipping the ORM unit of work
+        playdate_id = data_manager.add_playdate(new_playdate)
 
         return jsonify({
-            'id': new_playdate.id,
-            'title': new_playdate.title,
-            'sport_id': new_playdate.sport_id,
-            'creator_id': new_playdate.creator_id,
-            'address': new_playdate.address,
-            'longitude': new_playdate.longitude,
-            'latitude': new_playdate.latitude,
-            'date': new_playdate.date.isoformat(),
-            'max_participants': new_playdate.max_participants
+            'id': playdate_id,
+            **new_playdate
         }), 201
 
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Sport or creator not found!'}), 404
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -189,36 +415,29 @@ def add_playdate():
 # Endpoint to get all playdates
 @app.route('/playdates', methods=['GET'])
 def get_playdates():
-    playdates = Playdate.query.all()
-    sports = Sport.query.all()
+    # The sport name comes from a LEFT OUTER JOIN, and only the serialized columns are selected
+    playdates, next_cursor = paginate(
+        db.session.query(Playdate.id, Playdate.title, Sport.sport_name, Playdate.creator_id, Playdate.address,
+                         Playdate.latitude, Playdate.longitude, Playdate.date, Playdate.max_participants)
+        .outerjoin(Sport, Playdate.sport_id == Sport.id),
+        Playdate
+    )
 
-    playdates_data = [
-        {
-            "id": playdate.id,
-            "title": playdate.title,
-            "sport_name": next((sport.sport_name for sport in sports if sport.id == playdate.sport_id), None),
-            "creator_id": playdate.creator_id,
-            "address": playdate.address,
-            "latitude": playdate.latitude,
-            "longitude": playdate.longitude,
-            "date": playdate.date,
-            "max_participants": playdate.max_participants
-        } for playdate in playdates
-    ]
-    return jsonify(playdates_data)
+    playdates_data = [playdate._asdict() for playdate in playdates]
+    return with_next_cursor(jsonify(playdates_data), next_cursor)
 
 
 # Endpoint to get a specific playdate by ID
 @app.route('/playdates/<int:playdate_id>', methods=['GET'])
+@response_cache.cached(SHORT_TTL)
 def get_playdate(playdate_id):
-    playdate = data_manager.get_playdate_by_id(playdate_id)
-    sports = Sport.query.all()
+    playdate = Playdate.query.options(joinedload(Playdate.sport)).filter_by(id=playdate_id).first()
 
     if playdate:
         playdate_data = {
             "id": playdate.id,
             "title": playdate.title,
-            "sport_name": next((sport.sport_name for sport in sports if sport.id == playdate.sport_id), None),
+            "sport_name": playdate.sport.sport_name if playdate.sport else None,
             "creator_id": playdate.creator_id,
             "address": playdate.address,
             "latitude": playdate.latitude,
@@ -227,101 +446,146 @@ def get_playdate(playdate_id):
             "max_participants": playdate.max_participants
         }
         return jsonify(playdate_data)
-    return jsonify({"message": "Playdate not found!"}), 404
+    return static_response(_PLAYDATE_NOT_FOUND, 404)
 
 
 # Endpoint to add a sport_interest
 @app.route('/sport_interest', methods=['POST'])
 def add_sport_interest():
-    data = request.get_json()
+    data = request.get_json(cache=False, silent=True) or {}
 
-    if not data or not all(key in data for key in ('user_id', 'sport_id')):
-        return jsonify({"error": "Missing required fields: 'user_id' and/or 'sport_id'"}), 400
+    try:
+        validate_sport_interest(data)
+    except JsonSchemaException as e:
+        return jsonify({"error": e.message}), 400
 
     user_id = data.get('user_id')
     sport_id = data.get('sport_id')
 
-    user = User.query.get(user_id)
-    sport = Sport.query.get(sport_id)
+    # Only the ids are needed, so check both rows in one query without loading them
+    user_id, sport_id = db.session.query(
+        db.session.query(User.id).filter(User.id == user_id).scalar_subquery(),
+        db.session.query(Sport.id).filter(Sport.id == sport_id).scalar_subquery()
+    ).one()
 
-    if not user or not sport:
+    if user_id is None or sport_id is None:
         return jsonify({"error": "User or sport not found!"}), 404
 
-    user = data_manager.get_user_by_id(user_id)
-    sport = data_manager.get_sport_by_id(sport_id)
+    data_manager.add_sport_interest(user_id=user_id, sport_id=sport_id)
+    return jsonify({"message": "User added a sport interest!"}), 201
+
+
+# Endpoint to add several sport interests for a user at once
+@app.route('/sport_interest/bulk', methods=['POST'])
+def add_sport_interests():
+    data = request.get_json(cache=False, silent=True) or {}
+
+    try:
+        validate_sport_interest_bulk(data)
+    except JsonSchemaException as e:
+        return jsonify({"error": e.message}), 400
+
+    sport_ids = data['sport_ids']
+    user_id = db.session.query(User.id).filter(User.id == data['user_id']).scalar()
+    if user_id is None:
+        return static_response(_USER_NOT_FOUND, 404)
+
+    found_sport_ids = {sport_id for sport_id, in db.session.query(Sport.id).filter(Sport.id.in_(sport_ids))}
+    missing = [sport_id for sport_id in sport_ids if sport_id not in found_sport_ids]
+    if missing:
+        return jsonify({"error": f"Sports not found: {missing}"}), 404
 
-    if user and sport:
-        data_manager.add_sport_interest(user_id=user.id, sport_id=sport.id)
-        return jsonify({"message": "User added a sport interest!"}), 201
-    return jsonify({"message": "User or sport not found!"}), 404
+    added = data_manager.add_sport_interests(user_id=user_id, sport_ids=sport_ids)
+    return jsonify({"message": f"User added {added} sport interests!"}), 201
 
 
 # Endpoint to get the sport interest
 @app.route('/sport_interest', methods=['GET'])
+@response_cache.cached(NORMAL_TTL)
 def get_sport_interest():
     """Fetch all sport interests."""
-    sport_interests = SportInterest.query.all()
-    if sport_interests:
-        sport_interest_data = [
-            {
-                "id": sport_interest.id,
-                "sport_id": sport_interest.sport_id,
-                "user_id": sport_interest.user_id,
-            } for sport_interest in sport_interests
-        ]
-        return jsonify(sport_interest_data)
-    return jsonify({"message": "Sport Interest not found!"}), 404
+    sport_interests, next_cursor = paginate(
+        db.session.query(SportInterest.id, SportInterest.sport_id, SportInterest.user_id), SportInterest)
+    sport_interest_data = [sport_interest._asdict() for sport_interest in sport_interests]
+    return with_next_cursor(jsonify(sport_interest_data), next_cursor)
+
+
+def playdate_participants_list(playdate_id):
+    """Return the participants of a playdate as id/username dicts, loaded with a single join."""
+    participants = db.session.query(Participant.user_id, User.username) \
+        .join(User, User.id == Participant.user_id) \
+        .filter(Participant.playdate_id == playdate_id) \
+        .order_by(Participant.id) \
+        .all()
+    return [{"id": user_id, "username": username} for user_id, username in participants]
 
 
 # Endpoint to add a participant to a playdate
 @app.route('/playdates/<int:playdate_id>/participants', methods=['POST'])
 def add_participant(playdate_id):
-    data = request.get_json()
-    user_id = data.get('user_id')
-
-    if not user_id:
-        return jsonify({"message": "Missing 'user_id' in request data!"}), 400
-
-    user = User.query.get(user_id)
-    playdate = Playdate.query.get(playdate_id)
+    data = request.get_json(cache=False, silent=True) or {}
 
-    if not user:
+    try:
+        validate_participant(data)
+    except JsonSchemaException as e:
+        return jsonify({"error": e.message}), 400
+    user_id = data['user_id']
+
+    # Resolve the user, the playdate, its participant count and the duplicate check in one round-trip
+    already_joined = db.session.query(Participant.id) \
+        .filter(Participant.playdate_id == Playdate.id, Participant.user_id == User.id) \
+        .exists()
+    row = db.session.query(User.id, Playdate.id, Playdate.title, Playdate.date, Playdate.max_participants,
+                           Playdate.participant_count, already_joined.label('already_joined')) \
+        .select_from(User) \
+        .outerjoin(Playdate, Playdate.id == playdate_id) \
+        .filter(User.id == user_id) \
+        .first()
+
+    if not row:
         return jsonify({"message": f"User with ID {user_id} not found!"}), 404
-    if not playdate:
+    user_id, found_playdate_id, title, date, max_participants, current_participants, already_joined = row
+    if found_playdate_id is None:
         return jsonify({"message": f"Playdate with ID {playdate_id} not found!"}), 404
 
-    existing_participant = Participant.query.filter_by(user_id=user.id, playdate_id=playdate.id).first()
-    if existing_participant:
+    if already_joined:
         return jsonify({"message": "User is already a participant!"}), 409
 
-    current_participants = len(playdate.participants)
-    if playdate.max_participants and current_participants >= playdate.max_participants:
+    if max_participants and current_participants >= max_participants:
         return jsonify({"message": "Playdate has reached its maximum capacity!"}), 403
 
     try:
-        new_participant = Participant(user_id=user.id, playdate_id=playdate.id)
-        db.session.add(new_participant)
-        db.session.commit()
+        # The unique (playdate_id, user_id) index turns a concurrent double join into a no-op insert
+        result = db.session.execute(
+            sqlite_insert(Participant).values(user_id=user_id, playdate_id=playdate_id).on_conflict_do_nothing()
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            return jsonify({"message": "User is already a participant!"}), 409
 
-        updated_playdate = Playdate.query.get(playdate_id)
-        updated_participants_count = len(updated_playdate.participants)
+        # The insert holds SQLite's write lock, so this count can't be raced by another join
+        updated_participants_count = data_manager.count_playdate_participants(playdate_id)
+        if max_participants and updated_participants_count > max_participants:
+            db.session.rollback()
+            return jsonify({"message": "Playdate has reached its maximum capacity!"}), 403
 
-        print(f"Playdate ID {playdate_id} now has {updated_participants_count} participants.")
+        db.session.commit()
+
+        app.logger.debug("Playdate ID %s now has %s participants.", playdate_id, updated_participants_count)
     except Exception as e:
+        db.session.rollback()
         return jsonify({"message": f"An error occurred: {str(e)}"}), 500
 
     # Serialize the Playdate object
     playdate_dict = {
-        "id": updated_playdate.id,
-        "title": updated_playdate.title,
-        "date": updated_playdate.date.strftime('%Y-%m-%d %H:%M:%S') if updated_playdate.date else None,
-        "max_participants": updated_playdate.max_participants,
-        "participants_count": updated_participants_count,
-        "participants": [
-            {"id": participant.user_id, "username": User.query.get(participant.user_id).username}
-            for participant in updated_playdate.participants
-        ]
+        "id": playdate_id,
+        "title": title,
+        "date": date,
+        "max_participants": max_participants,
+        "participants_count": updated_participants_count
     }
+    if request.args.get('expand') == 'participants':
+        playdate_dict["participants"] = playdate_participants_list(playdate_id)
 
     return jsonify({
         "message": "User added as a participant!",
@@ -330,37 +594,94 @@ def add_participant(playdate_id):
     }), 201
 
 
+# Endpoint to add several participants to a playdate at once
+@app.route('/playdates/<int:playdate_id>/participants/bulk', methods=['POST'])
+def add_participants(playdate_id):
+    data = request.get_json(cache=False, silent=True) or {}
+
+    try:
+        validate_participant_bulk(data)
+    except JsonSchemaException as e:
+        return jsonify({"error": e.message}), 400
+    user_ids = data['user_ids']
+
+    playdate = db.session.query(Playdate.max_participants, Playdate.participant_count) \
+        .filter(Playdate.id == playdate_id) \
+        .first()
+    if not playdate:
+        return static_response(_PLAYDATE_NOT_FOUND, 404)
+    max_participants, current_participants = playdate
+
+    found_user_ids = {user_id for user_id, in db.session.query(User.id).filter(User.id.in_(user_ids))}
+    missing = [user_id for user_id in user_ids if user_id not in found_user_ids]
+    if missing:
+        return jsonify({"message": f"Users not found: {missing}"}), 404
+
+    joined_user_ids = {user_id for user_id, in db.session.query(Participant.user_id)
+                       .filter(Participant.playdate_id == playdate_id, Participant.user_id.in_(user_ids))}
+    new_user_ids = [user_id for user_id in user_ids if user_id not in joined_user_ids]
+
+    if max_participants and current_participants + len(new_user_ids) > max_participants:
+        return jsonify({"message": "Playdate doesn't have room for all of these participants!"}), 403
+
+    try:
+        if new_user_ids:
+            db.session.execute(
+                sqlite_insert(Participant).on_conflict_do_nothing(),
+                [{'user_id': user_id, 'playdate_id': playdate_id} for user_id in new_user_ids]
+            )
+            # Re-count under the write lock the insert took, in case other joins landed since the check above
+            current_participants = data_manager.count_playdate_participants(playdate_id)
+            if max_participants and current_participants > max_participants:
+                db.session.rollback()
+                return jsonify({"message": "Playdate doesn't have room for all of these participants!"}), 403
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"An error occurred: {str(e)}"}), 500
+
+    return jsonify({
+        "message": f"Added {len(new_user_ids)} participants!",
+        "playdate_id": playdate_id,
+        "participants_count": current_participants
+    }), 201
+
+
 # Endpoint to remove a participant from a playdate
 @app.route('/playdates/<int:playdate_id>/participants/<int:user_id>', methods=['DELETE'])
 def remove_participant(playdate_id, user_id):
-    user = User.query.get(user_id)
-    playdate = Playdate.query.get(playdate_id)
-
-    if not user or not playdate:
+    participant_id = db.session.query(Participant.id) \
+        .filter(Participant.playdate_id == Playdate.id, Participant.user_id == User.id) \
+        .scalar_subquery()
+    row = db.session.query(Playdate.id, Playdate.title, Playdate.date, Playdate.max_participants,
+                           participant_id.label('participant_id')) \
+        .select_from(User) \
+        .join(Playdate, Playdate.id == playdate_id) \
+        .filter(User.id == user_id) \
+        .first()
+
+    if not row:
         return jsonify({"message": "User or playdate not found!"}), 404
 
-    participant = Participant.query.filter_by(user_id=user.id, playdate_id=playdate.id).first()
-    if not participant:
+    playdate_id, title, date, max_participants, participant_id = row
+    if not participant_id:
         return jsonify({"message": "User is not a participant in this playdate!"}), 404
 
     try:
-        db.session.delete(participant)
+        Participant.query.filter_by(id=participant_id).delete(synchronize_session=False)
         db.session.commit()
 
-        updated_playdate = Playdate.query.get(playdate_id)
-        updated_participants_count = len(updated_playdate.participants)
+        participants_list = playdate_participants_list(playdate_id)
+        updated_participants_count = len(participants_list)
 
         # Serialize the updated playdate data
         playdate_dict = {
-            "id": updated_playdate.id,
-            "title": updated_playdate.title,
-            "date": updated_playdate.date.strftime('%Y-%m-%d %H:%M:%S') if updated_playdate.date else None,
-            "max_participants": updated_playdate.max_participants,
+            "id": playdate_id,
+            "title": title,
+            "date": date,
+            "max_participants": max_participants,
             "participants_count": updated_participants_count,
-            "participants": [
-                {"id": participant.user_id, "username": User.query.get(participant.user_id).username}
-                for participant in updated_playdate.participants
-            ]
+            "participants": participants_list
         }
 
         return jsonify({
@@ -376,25 +697,18 @@ def remove_participant(playdate_id, user_id):
 
 @app.route('/playdates/<int:playdate_id>/participants', methods=['GET'])
 def get_participants(playdate_id):
-    playdate = Playdate.query.get(playdate_id)
+    playdate = db.session.query(Playdate.title, Playdate.max_participants) \
+        .filter(Playdate.id == playdate_id) \
+        .first()
 
     if not playdate:
-        return jsonify({"message": "Playdate not found!"}), 404
+        return static_response(_PLAYDATE_NOT_FOUND, 404)
 
-    participants = Participant.query.filter_by(playdate_id=playdate_id).all()
+    participants_list = playdate_participants_list(playdate_id)
 
-    if not participants:
+    if not participants_list:
         return jsonify({"message": "No participants found for this playdate!"}), 404
 
-    # Serialize the participant data
-    participants_list = [
-        {
-            "id": participant.user_id,
-            "username": User.query.get(participant.user_id).username
-        }
-        for participant in participants
-    ]
-
     return jsonify({
         "playdate_id": playdate_id,
         "title": playdate.title,
@@ -412,29 +726,36 @@ def remove_user(user_id):
         try:
             data_manager.remove_user(user_id)
             return jsonify({"message": "User deleted successfully!"}), 200
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"error": "User still has playdates, sport interests or messages"}), 409
         except Exception as e:
             return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-    return jsonify({"message": "User not found!"}), 404
+    return static_response(_USER_NOT_FOUND, 404)
 
 
 @app.route('/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
-    data = request.get_json()
+    data = request.get_json(cache=False, silent=True) or {}
 
     user = data_manager.get_user_by_id(user_id)
     if not user:
-        return jsonify({"message": "User not found!"}), 404
+        return static_response(_USER_NOT_FOUND, 404)
 
     user.username = data.get('username', user.username)
     user.first_name = data.get('first_name', user.first_name)
     user.last_name = data.get('last_name', user.last_name)
     user.email = data.get('email', user.email)
-    user.password = data.get('password', user.password)
+    if 'password' in data:
+        user.password = hash_password(data['password'])
 
     try:
         db.session.commit()
         return jsonify({"message": "User updated successfully!"}), 200
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Username or email is already in use"}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
@@ -449,23 +770,26 @@ def delete_sport(sport_id):
             db.session.delete(sport)
             db.session.commit()
             return jsonify({"message": "Sport deleted successfully!"}), 200
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"error": "Sport is still used by playdates or sport interests"}), 409
         except Exception as e:
             db.session.rollback()
             return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-    return jsonify({"message": "Sport not found!"}), 404
+    return static_response(_SPORT_NOT_FOUND, 404)
 
 
 @app.route('/sports/<int:sport_id>', methods=['PUT'])
 def update_sport(sport_id):
-    data = request.get_json()
+    data = request.get_json(cache=False, silent=True) or {}
 
     sport = data_manager.get_sport_by_id(sport_id)
     if not sport:
-        return jsonify({"message": "Sport not found!"}), 404
+        return static_response(_SPORT_NOT_FOUND, 404)
 
     sport.sport_name = data.get('sport_name', sport.sport_name)
-    if 'sport_type' in data and data['sport_type'] in [e.value for e in SportType]:
+    if 'sport_type' in data and data['sport_type'] in _SPORT_TYPE_VALUES:
         sport.sport_type = SportType[data['sport_type'].upper()]
 
     try:
@@ -485,48 +809,62 @@ def delete_playdate(playdate_id):
             db.session.delete(playdate)
             db.session.commit()
             return jsonify({"message": "Playdate deleted successfully!"}), 200
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"error": "Playdate still has participants or messages"}), 409
         except Exception as e:
             db.session.rollback()
             return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-    return jsonify({"message": "Playdate not found!"}), 404
+    return static_response(_PLAYDATE_NOT_FOUND, 404)
 
 
 @app.route('/playdates/<int:playdate_id>', methods=['PUT'])
 def update_playdate(playdate_id):
-    data = request.get_json()
+    data = request.get_json(cache=False, silent=True) or {}
 
-    if not all(k in data for k in ('title', 'sport_id', 'address', 'date', 'max_participants')):
-        return jsonify({'error': 'Missing required fields'}), 400
+    try:
+        validate_playdate_update(data)
+    except JsonSchemaException as e:
+        return jsonify({'error': e.message}), 400
 
     playdate = data_manager.get_playdate_by_id(playdate_id)
     if not playdate:
-        return jsonify({"message": "Playdate not found!"}), 404
+        return static_response(_PLAYDATE_NOT_FOUND, 404)
+
+    try:
+        playdate_date = parse_request_datetime(data['date'])
+    except ValueError:
+        return jsonify({'error': 'Invalid date format'}), 400
 
-    latitude, longitude = data_manager.get_location_coordinates(data['address'])
-    if latitude is None or longitude is None:
-        return jsonify({'error': 'Unable to fetch coordinates for the new address'}), 400
+    if db.session.query(Sport.id).filter(Sport.id == data['sport_id']).scalar() is None:
+        return jsonify({'error': 'Sport not found!'}), 404
 
-    playdate.title = data.get('title', playdate.title)
-    playdate.sport_id = data.get('sport_id', playdate.sport_id)
-    playdate.creator_id = data.get('creator_id', playdate.creator_id)
-    playdate.address = data.get('address', playdate.address)
-    playdate.date = datetime.strptime(data.get('date', playdate.date.strftime('%d-%m-%Y %H:%M:%S')),
-                                      '%d-%m-%Y %H:%M:%S')
-    playdate.max_participants = data.get('max_participants', playdate.max_participants)
+    # Most updates keep the address, and then the stored coordinates are still right
+    if data['address'] == playdate.address:
+        latitude, longitude = playdate.latitude, playdate.longitude
+    else:
+        latitude, longitude = data_manager.get_location_coordinates(data['address'])
+        if latitude is None or longitude is None:
+            return jsonify({'error': 'Unable to fetch coordinates for the new address'}), 400
+
+    values = {
+        'title': data['title'],
+        'sport_id': data['sport_id'],
+        'address': data['address'],
+        'latitude': latitude,
+        'longitude': longitude,
+        'date': playdate_date,
+        'max_participants': data['max_participants']
+    }
 
     try:
-        db.session.commit()
-        return jsonify({
-            'id': playdate.id,
-            'title': playdate.title,
-            'sport_id': playdate.sport_id,
-            'address': playdate.address,
-            'latitude': playdate.latitude,
-            'longitude': playdate.longitude,
-            'date': playdate.date.strftime('%Y-%m-%d %H:%M:%S'),
-            'max_participants': playdate.max_participants
-        }), 200
+        if not data_manager.update_playdate(playdate_id, values):
+            return static_response(_PLAYDATE_NOT_FOUND, 404)
+        return jsonify({'id': playdate_id, **values}), 200
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Sport not found!'}), 404
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
@@ -534,17 +872,24 @@ def update_playdate(playdate_id):
 
 @app.route('/login', methods=['POST'])
 def login():
-    data = request.get_json()
+    data = request.get_json(cache=False, silent=True) or {}
 
-    if not data or not all(key in data for key in ('email', 'password')):
-        return jsonify({"error": "Missing 'email' or 'password'"}), 400
+    try:
+        validate_login(data)
+    except JsonSchemaException as e:
+        return jsonify({'error': e.message}), 400
 
     email = data.get('email')
     password = data.get('password')
 
-    user = User.query.filter_by(email=email).first()
+    # One indexed lookup of just the columns the token needs, without building a User object
+    user = db.session.query(User.id, User.username, User.email, User.first_name, User.last_name, User.password) \
+        .filter(User.email.collate('NOCASE') == email) \
+        .first()
 
-    if user and user.password == password:
+    if user is None:
+        run_cpu_bound(check_password_hash, _DUMMY_PASSWORD_HASH, password)
+    elif verify_password(user.id, user.password, password):
         identity = f"{user.username}"
         access_token = create_access_token(identity=identity, additional_claims={
             "email": user.email,
@@ -553,8 +898,7 @@ def login():
             "userId": user.id
         })
         return jsonify({"access_token": access_token}), 200
-    else:
-        return jsonify({"error": "Invalid email or password"}), 401
+    return jsonify({"error": "Invalid email or password"}), 401
 
 
 @app.route('/protected', methods=['GET'])
@@ -568,24 +912,31 @@ def protected():
 def check_if_token_in_blacklist(jwt_header, jwt_payload):
     """Check if a token is in the list of revoked tokens."""
     jti = jwt_payload['jti']
-    print(jwt_header)
-    return jti in revoked_tokens
+    if jti in revoked_tokens:
+        return True
+    if data_manager.is_token_revoked(jti):
+        revoked_tokens.add(jti, jwt_payload['exp'])
+        return True
+    return False
 
 
 @app.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
     """Log out the user by revoking the JWT token."""
-    jti = get_jwt()['jti']
-    revoked_tokens.add(jti)
+    token = get_jwt()
+    data_manager.revoke_token(token['jti'], token['exp'])
+    revoked_tokens.add(token['jti'], token['exp'])
     return jsonify({"message": "Successfully logged out!"}), 200
 
 
 @app.route('/chat', methods=['GET'])
 def get_chat():
-    chats = data_manager.get_all_chat()
-    if not chats:
-        return jsonify({"message": "no chat found"}, 404)
+    chats, next_cursor = paginate(
+        db.session.query(Chat.id, Chat.sender_id, Chat.receiver_id, Chat.room_id, Chat.message, Chat.message_type,
+                         Chat.status, Chat.date),
+        Chat
+    )
 
     chat_data = [
         {
@@ -596,10 +947,10 @@ def get_chat():
             "message": chat.message,
             "message_type": chat.message_type.name,
             "status": chat.status,
-            "date": chat.date.strftime('%Y-%m-%d %H:%M:%S')
+            "date": chat.date
         } for chat in chats
     ]
-    return jsonify(chat_data)
+    return with_next_cursor(jsonify(chat_data), next_cursor)
 
 
 @app.route('/chat/<int:chat_id>', methods=['GET'])
@@ -614,19 +965,20 @@ def get_chat_by_id(chat_id):
             "message": chat.message,
             "message_type": chat.message_type.name,
             "status": chat.status,
-            "date": chat.date.strftime('%Y-%m-%d %H:%M:%S')
+            "date": chat.date
         }
         return jsonify(chat_data)
-    return jsonify({"message": "Chat not found!"}), 404
+    return static_response(_CHAT_NOT_FOUND, 404)
 
 
 @app.route('/chat', methods=['POST'])
 def add_chat():
-    data = request.get_json()
+    data = request.get_json(cache=False, silent=True) or {}
 
-    # Ensure all required fields are present
-    if not all(k in data for k in ('sender_id', 'message', 'message_type', 'date')):
-        return jsonify({'error': 'Missing required fields'}), 400
+    try:
+        validate_chat(data)
+    except JsonSchemaException as e:
+        return jsonify({'error': e.message}), 400
 
     if 'receiver_id' not in data and 'room_id' not in data:
         return jsonify({'error': 'Either receiver_id or room_id must be provided'}), 400
@@ -635,53 +987,73 @@ def add_chat():
         return jsonify({'error': 'Cannot have both receiver_id and room_id'}), 400
 
     try:
-        chat_date = datetime.strptime(data['date'], '%d-%m-%Y %H:%M:%S')
+        chat_date = parse_request_datetime(data['date'])
     except ValueError:
         return jsonify({'error': 'Invalid date format'}), 400
 
+    # The other of receiver_id and room_id is None, and its subquery then yields NULL without matching anything
+    sender_id, receiver_id, room_id = db.session.query(
+        db.session.query(User.id).filter(User.id == data['sender_id']).scalar_subquery(),
+        db.session.query(User.id).filter(User.id == data.get('receiver_id')).scalar_subquery(),
+        db.session.query(Playdate.id).filter(Playdate.id == data.get('room_id')).scalar_subquery()
+    ).one()
+    if sender_id is None or (receiver_id is None and room_id is None):
+        return jsonify({'error': 'Sender, receiver or room not found!'}), 404
+
     # Create a new chat message entry in the database
-    new_chat = Chat(
+    new_chat = dict(
         sender_id=data['sender_id'],
-        receiver_id=data['receiver_id'],
+        receiver_id=data.get('receiver_id'),
         room_id=data.get('room_id'),
         message=data['message'],
-        message_type=data['message_type'],
+        message_type=MessageType[data['message_type']],
         date=chat_date,
         status=data.get('status', 'sent')
     )
 
-    # Add to the session and commit to the database
-    db.session.add(new_chat)
-    db.session.commit()
+    try:
+        data_manager.add_chat(new_chat)
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Sender, receiver or room not found!'}), 404
 
     return jsonify({'message': 'Chat added successfully'}), 201
 
 
+def socket_claims(data):
+    """Claims of the client sending a Socket.IO event: those verified at connect, else from the event's token."""
+    claims = session_claims.get(request.sid)
+    if claims is not None and claims['exp'] > time.time():
+        return claims
+    return socket_tokens.decode(data["token"])
+
+
 @socketio.on("connect")
 def handle_connect():
     auth = request.args.get("token")
     if not auth:
-        print("No token provided, disconnecting...")
+        app.logger.debug("No token provided, disconnecting...")
         handle_disconnect()
         return
 
     try:
-        decoded = decode_token(auth)
-        print(f"✅ User {decoded['sub']} connected")
+        decoded = socket_tokens.decode(auth)
+        session_claims[request.sid] = decoded
+        app.logger.debug("User %s connected", decoded['sub'])
     except Exception as e:
-        print(f"❌ Invalid token: {e}")
+        app.logger.warning("Invalid token: %s", e)
         handle_disconnect()
 
 
 @socketio.on("disconnect")
 def handle_disconnect():
-    for username, room in list(users.items()):
-        if request.sid == users[username]:
-            leave_room(room)
-            emit("receive_message", {"username": "System", "message": f"{username} has left the room."}, to=room)
-            del users[username]
-            break
-    print("A user disconnected")
+    session_claims.pop(request.sid, None)
+    info = sid_to_user.pop(request.sid, None)
+    if info:
+        username, room = info
+        leave_room(room)
+        emit("receive_message", {"username": "System", "message": f"{username} has left the room."}, to=room)
+    app.logger.debug("A user disconnected")
 
 
 @socketio.on('join_room')
@@ -690,7 +1062,7 @@ def handle_join(data):
         # verify_jwt_in_request()  # This will now check the headers for the token
         # user = get_jwt_identity()
         # username = user["firstName"]  # Extract firstName from the token
-        decoded_token = decode_token(data["token"])
+        decoded_token = socket_claims(data)
         # room = data.get("room")
         firstname = decoded_token["firstName"]
         username = decoded_token["sub"]
@@ -700,10 +1072,11 @@ def handle_join(data):
         #             raise ValueError("Either playdate_id or receiver_id is required.")
 
         join_room(room)
-        print(f"✅ User {username} joined {room}")
+        sid_to_user[request.sid] = (username, room)
+        app.logger.debug("User %s joined %s", username, room)
         emit("room_joined", {"username": f"{username}", "message": f"{firstname} joined the chat"}, to=room)
     except Exception as e:
-        print(f"JWT Error: {str(e)}")
+        app.logger.warning("JWT Error: %s", e)
         # emit("receive_message", {"username": f"{username}", "message": "Authentication failed"}, to=room)
 
 
@@ -711,17 +1084,19 @@ def handle_join(data):
 def handle_chat_history(data):
     room = data.get('room')
     receiver_id = data.get('receiver_id')
-    decoded_token = decode_token(data["token"])
+    decoded_token = socket_claims(data)
     current_user_id = decoded_token["userId"]
 
     if not room and not receiver_id:
         emit('error', {'message': 'Either room_id or receiver_id must be provided'})
         return
 
+    # The sender is always needed, so join it once and fill the relationship from that join
+    history = Chat.query.join(Chat.sender).options(contains_eager(Chat.sender))
     if room:
-        chats = Chat.query.options(joinedload(Chat.sender)).filter_by(room_id=room).order_by(Chat.date).all()
+        chats = history.filter(Chat.room_id == room).order_by(Chat.date).all()
     else:
-        chats = Chat.query.filter(
+        chats = history.filter(
             ((Chat.sender_id == receiver_id) & (Chat.receiver_id == current_user_id)) |
             ((Chat.sender_id == current_user_id) & (Chat.receiver_id == receiver_id))
         ).order_by(Chat.date).all()
@@ -737,21 +1112,19 @@ def handle_chat_history(data):
             "room_id": chat.room_id,
             "message": chat.message,
             "message_type": chat.message_type.name if isinstance(chat.message_type, Enum) else chat.message_type,
-            "date": chat.date.isoformat() if chat.date else None,
+            "date": chat.date,
             "status": chat.status,
             "sender": chat.sender.first_name
 
         })
 
-    print(f'sending messages of chat {room} ')
     # Emit the chat history to the client
     emit('chat_history', {'messages': messages_serialized})
-    print("here")
 
 
 @socketio.on('message')
 def handle_message(message):
-    print(f"Received message: {message}")
+    app.logger.debug("Received message: %s", message)
     socketio.send(f"Server received: {message}")
     emit('response', f"Server received your message: {message}")
 
@@ -759,8 +1132,7 @@ def handle_message(message):
 @socketio.on('send_message')
 def handle_send_message(data):
     # current_user_id = get_jwt_identity()
-    print('handle send message')
-    decoded_token = decode_token(data["token"])
+    decoded_token = socket_claims(data)
     room = data.get("room")
     sender = decoded_token["firstName"]
     current_user_id = decoded_token["userId"]
@@ -772,8 +1144,12 @@ def handle_send_message(data):
     # if receiver_id:
     #     private_chat_id = "_".join(map(str, sorted([sender_id, receiver_id])))
     # date = datetime.strptime(data['date'], '%Y-%m-%dT%H:%M:%S')
-    # Remove 'Z' and parse with datetime
-    date_utc = datetime.strptime(data['date'][:-1], "%Y-%m-%dT%H:%M:%S.%f")
+    try:
+        # Same parser as the HTTP endpoints, so offsets other than 'Z' are converted to naive UTC too
+        date_utc = parse_request_datetime(data['date'])
+    except ValueError:
+        emit('error', {'message': 'Invalid date format'})
+        return
     # Assign UTC timezone explicitly
     # date_utc = date_utc.replace(tzinfo=timezone.utc)
     # Validate either room_id or receiver_id is set, but not both
@@ -781,31 +1157,38 @@ def handle_send_message(data):
         emit('error', {'message': 'room_id must be provided'})
         return
 
+    # A row pointing at a missing user or playdate would fail its foreign key when the batch is written,
+    # after recipients already saw the message
+    if receiver_id:
+        target_exists = db.session.query(db.session.query(User.id).filter_by(id=receiver_id).exists()).scalar()
+    else:
+        target_exists = db.session.query(db.session.query(Playdate.id).filter_by(id=room).exists()).scalar()
+    if not target_exists:
+        emit('error', {'message': 'Receiver not found.' if receiver_id else 'Room not found.'})
+        return
+
     try:
         # date = datetime.strptime(data["date"], '%d-%m-%Y %H:%M:%S')
         message_type_enum = MessageType[message_type]
-        new_message = Chat(
-            sender_id=sender_id,
-            receiver_id=receiver_id,
-            room_id=room,
-            message=message,
-            message_type=message_type_enum,
-            date=date_utc,
-            status='sent'
-        )
-        if receiver_id:
-            new_message.private_chat_id = room
-            new_message.room_id = None
-
-        db.session.add(new_message)
-        db.session.commit()
+        # Private messages are keyed by private_chat_id rather than a playdate room
+        chat_writes.add({
+            'sender_id': sender_id,
+            'receiver_id': receiver_id,
+            'room_id': None if receiver_id else room,
+            'private_chat_id': room if receiver_id else None,
+            'message': message,
+            'message_type': message_type_enum,
+            'date': date_utc,
+            'status': 'sent'
+        })
 
+        # Recipients get the message right away; it reaches the database with the next batch
         emit('receive_message', {
             'sender_id': sender_id,
             'receiver_id': receiver_id,
             'room_id': room if room else None,
             'message': message,
-            'date': new_message.date.isoformat(),
+            'date': date_utc,
             'message_type': message_type,
             'sender': sender
         }, to=room)
@@ -813,38 +1196,42 @@ def handle_send_message(data):
     except KeyError:
         emit('error', {'message': 'Invalid message type.'})
     except Exception as e:
-        print(f"Error: {e}")
+        app.logger.exception("Error sending message: %s", e)
         emit('error', {'message': 'An error occurred while sending the message.'})
-    finally:
-        db.session.close()
 
 
 @socketio.on('leave_room')
 def handle_leave(data):
     token = data.get("token")
     if not token:
-        print("Token is missing or user is logged out.")
+        app.logger.debug("Token is missing or user is logged out.")
         return  # Exit the function if no token is present
 
     # If the token exists, decode it
     try:
-        decoded_token = decode_token(token)
+        decoded_token = socket_claims(data)
         firstname = decoded_token["firstName"]
     except Exception as e:
-        print(f"Error decoding token: {e}")
+        app.logger.warning("Error decoding token: %s", e)
         return  # Exit if decoding fails
     # Proceed with leaving the room
     room = data.get("room")
     if room:
         leave_room(room)
+        info = sid_to_user.get(request.sid)
+        if info and info[1] == room:
+            del sid_to_user[request.sid]
         # emit("leave_room", {"message": f"{firstname} has left the chat"}, to=room)
-        print(f"{firstname} has left the room.")
+        app.logger.debug("%s has left the room.", firstname)
     else:
-        print("No room specified.")
+        app.logger.debug("No room specified.")
 
     emit('message', {'message': f'{firstname} has left the room.'}, to=room)
 
 
 if __name__ == '__main__':
     port = int(os.getenv("PORT", 5000))
-    socketio.run(app, host="0.0.0.0", port=port, log_output=True, use_reloader=True, allow_unsafe_werkzeug=True)
+    # The reloader and request logging are for local development; production runs under gunicorn (see README)
+    dev_mode = os.getenv("FLASK_DEV") == '1'
+    socketio.run(app, host="0.0.0.0", port=port, log_output=dev_mode, use_reloader=dev_mode,
+                 allow_unsafe_werkzeug=dev_mode)
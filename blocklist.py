@@ -0,0 +1,33 @@
+import heapq
+import threading
+import time
+
+
+class TokenBlocklist:
+    """Revoked JWT IDs, each kept only until the token it revokes would have expired anyway."""
+
+    def __init__(self):
+        self._expiry_by_jti = {}
+        self._expiry_heap = []
+        self._lock = threading.Lock()
+
+    def add(self, jti, expires_at):
+        """Revoke a token until its `exp` timestamp (seconds since the epoch)."""
+        with self._lock:
+            self._prune(time.time())
+            self._expiry_by_jti[jti] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, jti))
+
+    def __contains__(self, jti):
+        expires_at = self._expiry_by_jti.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def __len__(self):
+        return len(self._expiry_by_jti)
+
+    def _prune(self, now):
+        """Drop every entry whose token has already expired."""
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, jti = heapq.heappop(self._expiry_heap)
+            if self._expiry_by_jti.get(jti) == expires_at:
+                del self._expiry_by_jti[jti]
@@ -0,0 +1,70 @@
+import logging
+import threading
+from collections import deque
+
+from sqlalchemy import insert
+
+from models import Chat, db
+
+logger = logging.getLogger(__name__)
+
+
+class ChatWriteBuffer:
+    """Queues chat messages sent over Socket.IO and writes them to the database in batches.
+
+    Each commit costs an fsync of the SQLite WAL, so instead of committing once per message a background task
+    flushes whatever has queued up every `interval` seconds in a single executemany INSERT.
+    """
+
+    def __init__(self, socketio, app, interval=0.05):
+        self._socketio = socketio
+        self._app = app
+        self._interval = interval
+        self._pending = deque()
+        self._started = False
+        self._lock = threading.Lock()
+
+    def add(self, row):
+        """Queue a Chat row (a dict of column values) for the next flush."""
+        self._pending.append(row)
+        if not self._started:
+            self._start()
+
+    def flush(self):
+        """Write every queued message in one transaction.
+
+        If the batch fails, the messages are written one at a time instead, so a single bad row only loses itself.
+        """
+        rows = []
+        while self._pending:
+            rows.append(self._pending.popleft())
+        if not rows:
+            return
+
+        with self._app.app_context():
+            try:
+                db.session.execute(insert(Chat), rows)
+                db.session.commit()
+                return
+            except Exception:
+                db.session.rollback()
+                logger.warning("Batch of %d chat messages failed, retrying one by one", len(rows))
+
+            for row in rows:
+                try:
+                    db.session.execute(insert(Chat), row)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error("Error saving chat message from user %s: %s", row.get('sender_id'), e)
+
+    def _start(self):
+        with self._lock:
+            if not self._started:
+                self._socketio.start_background_task(self._run)
+                self._started = True
+
+    def _run(self):
+        while True:
+            self._socketio.sleep(self._interval)
+            self.flush()
@@ -0,0 +1,114 @@
+"""Baseline schema
+
+Revision ID: 1d2d5735da43
+Revises:
+Create Date: 2026-10-15 16:46:00.000000
+
+Databases created before migrations were kept in the repository already have these tables but no
+alembic_version row, so each table is only created when it is missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1d2d5735da43'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'users' not in existing:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=50), nullable=False),
+            sa.Column('first_name', sa.String(length=50), nullable=False),
+            sa.Column('last_name', sa.String(length=50), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password', sa.String(length=255), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('username')
+        )
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+
+    if 'sports' not in existing:
+        op.create_table(
+            'sports',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sport_name', sa.String(length=100), nullable=False),
+            sa.Column('sport_type', sa.Enum('SINGLE', 'TEAM', 'BOTH', name='sporttype'), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_sports_sport_name', 'sports', ['sport_name'], unique=False)
+
+    if 'sport_interests' not in existing:
+        op.create_table(
+            'sport_interests',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('sport_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['sport_id'], ['sports.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'playdates' not in existing:
+        op.create_table(
+            'playdates',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=100), nullable=False),
+            sa.Column('sport_id', sa.Integer(), nullable=False),
+            sa.Column('creator_id', sa.Integer(), nullable=False),
+            sa.Column('address', sa.String(length=255), nullable=False),
+            sa.Column('longitude', sa.Float(), nullable=False),
+            sa.Column('latitude', sa.Float(), nullable=False),
+            sa.Column('date', sa.DateTime(), nullable=False),
+            sa.Column('max_participants', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['creator_id'], ['users.id']),
+            sa.ForeignKeyConstraint(['sport_id'], ['sports.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'participants' not in existing:
+        op.create_table(
+            'participants',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('playdate_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['playdate_id'], ['playdates.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'chat' not in existing:
+        op.create_table(
+            'chat',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sender_id', sa.Integer(), nullable=False),
+            sa.Column('receiver_id', sa.Integer(), nullable=True),
+            sa.Column('room_id', sa.Integer(), nullable=True),
+            sa.Column('private_chat_id', sa.String(), nullable=True),
+            sa.Column('message', sa.String(), nullable=False),
+            sa.Column('message_type', sa.Enum('TEXT', 'AUDIO', 'VIDEO', 'IMAGE', name='messagetype'), nullable=False),
+            sa.Column('date', sa.DateTime(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.ForeignKeyConstraint(['receiver_id'], ['users.id']),
+            sa.ForeignKeyConstraint(['room_id'], ['playdates.id']),
+            sa.ForeignKeyConstraint(['sender_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('chat')
+    op.drop_table('participants')
+    op.drop_table('playdates')
+    op.drop_table('sport_interests')
+    op.drop_index('ix_sports_sport_name', table_name='sports')
+    op.drop_table('sports')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_table('users')
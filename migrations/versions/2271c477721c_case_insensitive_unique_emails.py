@@ -0,0 +1,40 @@
+"""Case-insensitive unique emails
+
+Revision ID: 2271c477721c
+Revises: 4e070faea0e8
+Create Date: 2026-10-15 17:08:15.000000
+
+Autogenerate can't see the expression index, so this is hand-written: the NOCASE index is created before the old
+exact-match index is dropped, so email uniqueness is enforced throughout.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2271c477721c'
+down_revision = '4e070faea0e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT group_concat(email, ', ') FROM users GROUP BY email COLLATE NOCASE HAVING count(*) > 1"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(
+            "Emails must be unique regardless of case, but these accounts share an address: "
+            + "; ".join(duplicates) + ". Merge or rename them, then run the upgrade again."
+        )
+
+    op.execute("CREATE UNIQUE INDEX ix_users_email_nocase ON users (email COLLATE NOCASE)")
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_email')
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index('ix_users_email', ['email'], unique=True)
+
+    op.execute("DROP INDEX ix_users_email_nocase")
@@ -0,0 +1,33 @@
+"""Unique (user_id, sport_id) sport interests
+
+Revision ID: 4e070faea0e8
+Revises: 0abac1557755
+Create Date: 2026-10-15 17:07:12.000000
+
+A user could add the same interest twice before the unique index existed; all but the first of each are deleted
+before it is created.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e070faea0e8'
+down_revision = '0abac1557755'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "DELETE FROM sport_interests WHERE id NOT IN "
+        "(SELECT MIN(id) FROM sport_interests GROUP BY user_id, sport_id)"
+    )
+
+    with op.batch_alter_table('sport_interests', schema=None) as batch_op:
+        batch_op.create_index('uq_sport_interests_user_sport', ['user_id', 'sport_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('sport_interests', schema=None) as batch_op:
+        batch_op.drop_index('uq_sport_interests_user_sport')
@@ -0,0 +1,41 @@
+"""Participant and playdate lookup indexes
+
+Revision ID: 904be657556f
+Revises: 1d2d5735da43
+Create Date: 2026-10-15 16:46:29.000000
+
+Nothing stopped a user from joining the same playdate twice before the unique index existed; the extra rows carry no
+information, so all but the first of each are deleted before it is created.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '904be657556f'
+down_revision = '1d2d5735da43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "DELETE FROM participants WHERE id NOT IN "
+        "(SELECT MIN(id) FROM participants GROUP BY playdate_id, user_id)"
+    )
+
+    with op.batch_alter_table('participants', schema=None) as batch_op:
+        batch_op.create_index('uq_participants_playdate_user', ['playdate_id', 'user_id'], unique=True)
+        batch_op.create_index('ix_participants_user_playdate', ['user_id', 'playdate_id'], unique=False)
+
+    with op.batch_alter_table('playdates', schema=None) as batch_op:
+        batch_op.create_index('ix_playdates_sport_date', ['sport_id', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('playdates', schema=None) as batch_op:
+        batch_op.drop_index('ix_playdates_sport_date')
+
+    with op.batch_alter_table('participants', schema=None) as batch_op:
+        batch_op.drop_index('ix_participants_user_playdate')
+        batch_op.drop_index('uq_participants_playdate_user')
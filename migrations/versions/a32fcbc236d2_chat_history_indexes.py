@@ -0,0 +1,28 @@
+"""Chat history indexes
+
+Revision ID: a32fcbc236d2
+Revises: 904be657556f
+Create Date: 2026-10-15 16:51:19.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a32fcbc236d2'
+down_revision = '904be657556f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_room_date', ['room_id', 'date'], unique=False)
+        batch_op.create_index('ix_chat_sender_receiver_date', ['sender_id', 'receiver_id', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('chat', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_sender_receiver_date')
+        batch_op.drop_index('ix_chat_room_date')
@@ -0,0 +1,43 @@
+"""Trigger-maintained playdates.participant_count
+
+Revision ID: b26c517d613a
+Revises: 2271c477721c
+Create Date: 2026-10-15 17:08:54.000000
+
+Capacity checks read this column, so it has to match the participants table from the start: the triggers are
+created first and the column is then backfilled, in the same upgrade.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b26c517d613a'
+down_revision = '2271c477721c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('playdates', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('participant_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        "CREATE TRIGGER trg_participants_insert AFTER INSERT ON participants BEGIN "
+        "UPDATE playdates SET participant_count = participant_count + 1 WHERE id = NEW.playdate_id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER trg_participants_delete AFTER DELETE ON participants BEGIN "
+        "UPDATE playdates SET participant_count = participant_count - 1 WHERE id = OLD.playdate_id; END"
+    )
+    op.execute(
+        "UPDATE playdates SET participant_count = "
+        "(SELECT COUNT(*) FROM participants WHERE participants.playdate_id = playdates.id)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER trg_participants_delete")
+    op.execute("DROP TRIGGER trg_participants_insert")
+    # A batch rebuild would drop playdates while chat and participants still reference it; SQLite 3.35+ drops in place
+    op.execute("ALTER TABLE playdates DROP COLUMN participant_count")
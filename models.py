@@ -1,5 +1,6 @@
 from enum import Enum
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 
 db = SQLAlchemy()
 
@@ -11,12 +12,17 @@ class User(db.Model):
     username = db.Column(db.String(50), nullable=False, unique=True)
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False, index=True)
+    email = db.Column(db.String(120), nullable=False)
     password = db.Column(db.String(255), nullable=False)
 
     sport_interests = db.relationship('SportInterest', backref='user', lazy=True)
     playdates = db.relationship('Playdate', backref='creator', lazy=True)
 
+    __table_args__ = (
+        # Emails are unique regardless of case; lookups that compare with COLLATE NOCASE use this index
+        db.Index('ix_users_email_nocase', db.text('email COLLATE NOCASE'), unique=True),
+    )
+
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -51,6 +57,11 @@ class SportInterest(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     sport_id = db.Column(db.Integer, db.ForeignKey('sports.id'), nullable=False)
 
+    __table_args__ = (
+        # Serves the (user_id, sport_id) lookup and keeps a user from adding the same interest twice
+        db.Index('uq_sport_interests_user_sport', 'user_id', 'sport_id', unique=True),
+    )
+
     def __repr__(self):
         return f'<SportInterest User {self.user_id} interested in Sport {self.sport_id}>'
 
@@ -70,9 +81,16 @@ class Playdate(db.Model):
     latitude = db.Column(db.Float, nullable=False)
     date = db.Column(db.DateTime, nullable=False)
     max_participants = db.Column(db.Integer, nullable=True, default=None)
+    # Number of participants rows for this playdate, kept up to date by the triggers on participants
+    participant_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
+    sport = db.relationship('Sport', lazy=True)
     participants = db.relationship('Participant', backref='playdate', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_playdates_sport_date', 'sport_id', 'date'),
+    )
+
     def __repr__(self):
         return f'<Playdate {self.title} for Sport {self.sport_id} at {self.address}>'
 
@@ -87,10 +105,28 @@ class Participant(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     playdate_id = db.Column(db.Integer, db.ForeignKey('playdates.id'), nullable=False)
 
+    user = db.relationship('User', lazy=True)
+
+    __table_args__ = (
+        # Doubles as the guard against joining the same playdate twice
+        db.Index('uq_participants_playdate_user', 'playdate_id', 'user_id', unique=True),
+        db.Index('ix_participants_user_playdate', 'user_id', 'playdate_id'),
+    )
+
     def __repr__(self):
         return f'<Participant User {self.user_id} in Playdate {self.playdate_id}>'
 
 
+event.listen(Participant.__table__, 'after_create', DDL(
+    "CREATE TRIGGER trg_participants_insert AFTER INSERT ON participants BEGIN "
+    "UPDATE playdates SET participant_count = participant_count + 1 WHERE id = NEW.playdate_id; END"
+))
+event.listen(Participant.__table__, 'after_create', DDL(
+    "CREATE TRIGGER trg_participants_delete AFTER DELETE ON participants BEGIN "
+    "UPDATE playdates SET participant_count = participant_count - 1 WHERE id = OLD.playdate_id; END"
+))
+
+
 class MessageType(Enum):
     TEXT = "Text"
     AUDIO = "Audio"
@@ -115,5 +151,22 @@ class Chat(db.Model):
     receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages')
     room = db.relationship('Playdate', foreign_keys=[room_id], backref='chat_messages')
 
+    __table_args__ = (
+        # Room history and private conversations are both filtered by these columns and read in date order
+        db.Index('ix_chat_room_date', 'room_id', 'date'),
+        db.Index('ix_chat_sender_receiver_date', 'sender_id', 'receiver_id', 'date'),
+    )
+
     def __repr__(self):
         return f"<Chat(sender_id={self.sender_id}, receiver_id={self.receiver_id}, message={self.message})>"
+
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+
+    jti = db.Column(db.String(36), primary_key=True)
+    # The revoked token's `exp` claim (seconds since the epoch); the row can be dropped after that
+    expires_at = db.Column(db.Integer, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<RevokedToken {self.jti}>'
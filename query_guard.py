@@ -0,0 +1,38 @@
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import raiseload
+
+
+def warn_on_repeated_queries(app, threshold=5):
+    """Log a warning when a request runs the same SQL statement `threshold` or more times.
+
+    A statement repeated per row is the signature of an N+1 lazy load, so this is meant to be enabled while
+    developing to catch new ones as soon as a route triggers them.
+    """
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.setdefault('statement_counts', Counter())[statement] += 1
+
+    @app.after_request
+    def report_repeated_statements(response):
+        for statement, count in g.pop('statement_counts', Counter()).items():
+            if count >= threshold:
+                app.logger.warning("%s %s ran the same query %d times (N+1?): %s",
+                                   request.method, request.path, count, statement)
+        return response
+
+
+def raise_on_lazy_loads(session):
+    """Make every ORM query default its relationships to raiseload('*').
+
+    Relationships a query eager-loads explicitly are unaffected; touching any other one raises instead of silently
+    issuing a lazy load, so a missing loader option shows up as an error the first time the route runs.
+    """
+    @event.listens_for(session, 'do_orm_execute')
+    def add_raiseload(orm_execute_state):
+        if orm_execute_state.is_select and not orm_execute_state.is_relationship_load:
+            orm_execute_state.statement = orm_execute_state.statement.options(raiseload('*'))
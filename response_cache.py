@@ -0,0 +1,73 @@
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, request
+from sqlalchemy.exc import SQLAlchemyError
+
+# TTLs in seconds for the cache policies used by the GET endpoints. Invalidation only reaches the worker that handled
+# the write, so a TTL is also how long other workers may keep serving data that has since changed or been deleted.
+SHORT_TTL = 5
+NORMAL_TTL = 60
+
+# Response headers that are part of the cached result (CORS headers are added per request by after_request)
+_CACHED_HEADERS = ('X-Next-Cursor',)
+
+
+class ResponseCache:
+    """In-process cache of successful GET responses, keyed by path and query string.
+
+    Entries expire after the TTL of their endpoint and are dropped as soon as a write under the same collection
+    succeeds, see invalidate(). Each worker process keeps its own cache, so other workers can serve a stale page for
+    at most that TTL. If the database fails while refreshing an expired entry, the stale entry is served instead.
+    """
+
+    def __init__(self, maxsize=1024):
+        self._maxsize = maxsize
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def cached(self, ttl):
+        """Decorate a view so its 200 responses are reused for ttl seconds."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = request.full_path
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    return self._cached_response(entry)
+
+                try:
+                    response = current_app.make_response(view(*args, **kwargs))
+                except SQLAlchemyError:
+                    if entry is None:
+                        raise
+                    current_app.logger.warning("Database error on %s, serving a stale cached response", key)
+                    return self._cached_response(entry)
+                # Streamed bodies can't be stored without buffering them, which is what streaming avoids
+                if response.status_code == 200 and not response.is_streamed:
+                    headers = [(name, response.headers[name]) for name in _CACHED_HEADERS if name in response.headers]
+                    self._store(key, (time.monotonic() + ttl, response.get_data(), response.mimetype, headers))
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, prefix):
+        """Drop every cached response whose path starts with prefix."""
+        with self._lock:
+            self._entries = {key: entry for key, entry in self._entries.items()
+                             if not (key == prefix or key.startswith((prefix + '/', prefix + '?')))}
+
+    @staticmethod
+    def _cached_response(entry):
+        _, body, mimetype, headers = entry
+        return current_app.response_class(body, mimetype=mimetype, headers=headers)
+
+    def _store(self, key, entry):
+        with self._lock:
+            if len(self._entries) >= self._maxsize:
+                now = time.monotonic()
+                self._entries = {k: e for k, e in self._entries.items() if e[0] > now}
+                if len(self._entries) >= self._maxsize:
+                    self._entries.clear()
+            self._entries[key] = entry
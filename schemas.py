@@ -0,0 +1,124 @@
+import fastjsonschema
+from fastjsonschema import JsonSchemaException
+
+from models import MessageType, SportType
+
+NON_EMPTY_STRING = {'type': 'string', 'minLength': 1}
+ID = {'type': ['integer', 'string'], 'minLength': 1}
+# Bulk requests take a bounded list of distinct integer ids
+ID_LIST = {'type': 'array', 'items': {'type': 'integer'}, 'minItems': 1, 'maxItems': 500, 'uniqueItems': True}
+
+USER_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'username': NON_EMPTY_STRING,
+        'first_name': NON_EMPTY_STRING,
+        'last_name': NON_EMPTY_STRING,
+        'email': NON_EMPTY_STRING,
+        'password': NON_EMPTY_STRING
+    },
+    'required': ['username', 'first_name', 'last_name', 'email', 'password']
+}
+
+SPORT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'sport_name': NON_EMPTY_STRING,
+        'sport_type': {'enum': [e.value for e in SportType]}
+    },
+    'required': ['sport_name']
+}
+
+PLAYDATE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'title': NON_EMPTY_STRING,
+        'sport_id': ID,
+        'creator_id': ID,
+        'address': NON_EMPTY_STRING,
+        'date': {'type': 'string'},
+        'max_participants': {'type': ['integer', 'null']}
+    },
+    'required': ['title', 'sport_id', 'creator_id', 'address', 'date']
+}
+
+PLAYDATE_UPDATE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'title': NON_EMPTY_STRING,
+        'sport_id': ID,
+        'address': NON_EMPTY_STRING,
+        'date': {'type': 'string'},
+        'max_participants': {'type': ['integer', 'null']}
+    },
+    'required': ['title', 'sport_id', 'address', 'date', 'max_participants']
+}
+
+SPORT_INTEREST_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'user_id': ID,
+        'sport_id': ID
+    },
+    'required': ['user_id', 'sport_id']
+}
+
+SPORT_INTEREST_BULK_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'user_id': ID,
+        'sport_ids': ID_LIST
+    },
+    'required': ['user_id', 'sport_ids']
+}
+
+PARTICIPANT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'user_id': ID
+    },
+    'required': ['user_id']
+}
+
+PARTICIPANT_BULK_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'user_ids': ID_LIST
+    },
+    'required': ['user_ids']
+}
+
+LOGIN_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'email': {'type': 'string'},
+        'password': {'type': 'string'}
+    },
+    'required': ['email', 'password']
+}
+
+CHAT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'sender_id': ID,
+        'receiver_id': ID,
+        'room_id': ID,
+        'message': {'type': 'string'},
+        'message_type': {'enum': [e.name for e in MessageType]},
+        'date': {'type': 'string'},
+        'status': {'type': 'string'}
+    },
+    'required': ['sender_id', 'message', 'message_type', 'date']
+}
+
+# Each schema is compiled into a plain Python validator once, at import time
+validate_user = fastjsonschema.compile(USER_SCHEMA)
+validate_sport = fastjsonschema.compile(SPORT_SCHEMA)
+validate_playdate = fastjsonschema.compile(PLAYDATE_SCHEMA)
+validate_playdate_update = fastjsonschema.compile(PLAYDATE_UPDATE_SCHEMA)
+validate_sport_interest = fastjsonschema.compile(SPORT_INTEREST_SCHEMA)
+validate_sport_interest_bulk = fastjsonschema.compile(SPORT_INTEREST_BULK_SCHEMA)
+validate_participant = fastjsonschema.compile(PARTICIPANT_SCHEMA)
+validate_participant_bulk = fastjsonschema.compile(PARTICIPANT_BULK_SCHEMA)
+validate_login = fastjsonschema.compile(LOGIN_SCHEMA)
+validate_chat = fastjsonschema.compile(CHAT_SCHEMA)
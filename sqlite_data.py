@@ -1,9 +1,32 @@
+import logging
 import os
+import threading
+import time
 from abc import ABC
+from collections import OrderedDict
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import load_only, selectinload
 from config import BaseModel
-from models import User, Sport, SportInterest, Playdate, Participant, Chat
+from models import User, Sport, SportInterest, Playdate, Participant, Chat, RevokedToken
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Most playdates are at a handful of recurring places, so geocoding results are kept in memory
+GEOCODE_CACHE_SIZE = 10000
+# Places rarely move; after this long an entry is refreshed, but still served if Mapbox can't be reached
+GEOCODE_CACHE_TTL = 30 * 24 * 60 * 60
+# Failed lookups are remembered briefly so a bad address doesn't hit Mapbox on every retry
+GEOCODE_FAILURE_TTL = 60
+# (connect, read) timeouts in seconds for Mapbox requests
+MAPBOX_TIMEOUT = (2, 5)
+# Playdate columns a client may change; id, creator_id and the trigger-maintained participant_count are not among them
+EDITABLE_PLAYDATE_FIELDS = frozenset({'title', 'sport_id', 'address', 'latitude', 'longitude', 'date',
+                                      'max_participants'})
+
+logger = logging.getLogger(__name__)
 
 
 class SQLiteSportBuddyDataManager(BaseModel, ABC):
@@ -11,10 +34,18 @@ class SQLiteSportBuddyDataManager(BaseModel, ABC):
         """Initialize the SQLiteSportBuddyDataManager with the SQLAlchemy instance."""
         self.db = db
         self.mapbox_api_key = os.getenv("mapbox_api_key")
+        self._geocode_cache = OrderedDict()
+        self._geocode_cache_lock = threading.Lock()
+        # Keep-alive connections are reused across lookups instead of a new TCP and TLS handshake per request
+        self._http = requests.Session()
+        self._http.mount('https://', HTTPAdapter(
+            pool_connections=4, pool_maxsize=16,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        ))
 
     def get_all_users(self):
-        """Return a list of all users."""
-        return User.query.all()
+        """Return a list of all users, with only their public columns loaded up front."""
+        return User.query.options(load_only(User.id, User.username, User.first_name, User.last_name)).all()
 
     def get_all_sports(self):
         """Return a list of all sports."""
@@ -22,63 +53,65 @@ class SQLiteSportBuddyDataManager(BaseModel, ABC):
 
     def get_all_sport_interest(self, user_id, sport_id):
         """Return sport interest based on user_id and sport_id."""
-        sport_interest = SportInterest.query.get(user_id, sport_id)
-        return sport_interest.sport_interest_added if sport_interest else []
+        return SportInterest.query.filter_by(user_id=user_id, sport_id=sport_id).all()
 
     def get_user_playdates_created(self, user_id):
         """Return a list of events for a specific user."""
-        user = User.query.get(user_id)
-        return user.playdates_created if user else []
+        # Filter on the foreign key directly; loading the User first would only add a query
+        return Playdate.query.filter_by(creator_id=user_id).all()
 
     def add_user(self, user):
-        """Add a new user to the database."""
-        self.db.session.add(user)
+        """Insert a new user from a dict of column values and return its ID."""
+        result = self.db.session.execute(insert(User).values(**user))
         self.db.session.commit()
+        return result.inserted_primary_key[0]
 
     def remove_user(self, user_id):
         """Remove a user from the database."""
-        user = User.query.get(user_id)
+        user = self.db.session.get(User, user_id)
         if user:
             self.db.session.delete(user)
             self.db.session.commit()
 
     def add_sport(self, sport):
-        """Add a new sport to the database."""
-        self.db.session.add(sport)
+        """Insert a new sport from a dict of column values and return its ID."""
+        result = self.db.session.execute(insert(Sport).values(**sport))
         self.db.session.commit()
+        return result.inserted_primary_key[0]
 
     def add_playdate(self, playdate):
-        """Add a new event (playdate) to the database."""
-        self.db.session.add(playdate)
+        """Insert a new event (playdate) from a dict of column values and return its ID."""
+        result = self.db.session.execute(insert(Playdate).values(**playdate))
         self.db.session.commit()
+        return result.inserted_primary_key[0]
 
     def update_playdate(self, playdate_id, updated_playdate_data):
-        """Update the details of a specific event in the database."""
-        playdate = Playdate.query.get(playdate_id)
-        if playdate:
-            for key, value in updated_playdate_data.items():
-                if hasattr(playdate, key):
-                    setattr(playdate, key, value)
-            self.db.session.commit()
+        """Update the details of a specific event in the database and return the number of rows updated."""
+        values = {key: value for key, value in updated_playdate_data.items() if key in EDITABLE_PLAYDATE_FIELDS}
+        if not values:
+            return self.db.session.query(Playdate.id).filter_by(id=playdate_id).count()
+        updated = Playdate.query.filter_by(id=playdate_id).update(values, synchronize_session=False)
+        self.db.session.commit()
+        return updated
 
     def delete_playdate(self, playdate_id):
         """Delete a specific playdate from the database."""
-        playdate = Playdate.query.get(playdate_id)
+        playdate = self.db.session.get(Playdate, playdate_id)
         if playdate:
             self.db.session.delete(playdate)
             self.db.session.commit()
 
     def get_playdate_by_id(self, playdate_id):
         """Get a playdate by its ID."""
-        return Playdate.query.get(playdate_id)
+        return self.db.session.get(Playdate, playdate_id)
 
     def get_user_by_id(self, user_id):
         """Get a user by their ID."""
-        return User.query.get(user_id)
+        return self.db.session.get(User, user_id)
 
     def get_sport_by_id(self, sport_id):
         """Get a sport by its ID."""
-        return Sport.query.get(sport_id)
+        return self.db.session.get(Sport, sport_id)
 
     def get_user_by_username(self, username):
         """Return a user by their username."""
@@ -86,34 +119,94 @@ class SQLiteSportBuddyDataManager(BaseModel, ABC):
 
     def add_sport_interest(self, user_id, sport_id):
         """Add a new sport interest for a user."""
-        sport_interest = SportInterest(user_id=user_id, sport_id=sport_id)
-        self.db.session.add(sport_interest)
+        # Adding an interest the user already has is a no-op
+        self.db.session.execute(
+            sqlite_insert(SportInterest).values(user_id=user_id, sport_id=sport_id).on_conflict_do_nothing()
+        )
+        self.db.session.commit()
+
+    def add_sport_interests(self, user_id, sport_ids):
+        """Add several sport interests for a user with a single executemany INSERT, skipping ones already added.
+
+        Returns the number of interests actually inserted.
+        """
+        result = self.db.session.execute(sqlite_insert(SportInterest).on_conflict_do_nothing(),
+                                         [{'user_id': user_id, 'sport_id': sport_id} for sport_id in sport_ids])
         self.db.session.commit()
+        return result.rowcount
 
     def add_participant(self, user_id, playdate_id):
         """Add a user as a participant to a playdate."""
-        playdate = Playdate.query.get(playdate_id)
+        playdate = self.db.session.query(Playdate.max_participants, Playdate.participant_count) \
+            .filter(Playdate.id == playdate_id) \
+            .first()
         if playdate:
-            current_participants = len(playdate.participants)
-            if playdate.max_participants and current_participants >= playdate.max_participants:
+            max_participants, current_participants = playdate
+            if max_participants and current_participants >= max_participants:
                 raise ValueError("This playdate has reached the maximum number of participants.")
         participant = Participant(user_id=user_id, playdate_id=playdate_id)
         self.db.session.add(participant)
+        if playdate and playdate[0]:
+            # The flush takes SQLite's write lock, so the re-count also sees joins that raced the check above
+            self.db.session.flush()
+            if self.count_playdate_participants(playdate_id) > playdate[0]:
+                self.db.session.rollback()
+                raise ValueError("This playdate has reached the maximum number of participants.")
         self.db.session.commit()
 
+    def count_playdate_participants(self, playdate_id):
+        """Return the number of participants of a playdate from its trigger-maintained participant_count."""
+        return self.db.session.query(Playdate.participant_count) \
+            .filter(Playdate.id == playdate_id) \
+            .scalar()
+
     def remove_participant(self, user_id, playdate_id):
         """Remove a user from a playdate's participants."""
-        participant = Participant.query.filter_by(user_id=user_id, playdate_id=playdate_id).first()
-        if participant:
-            self.db.session.delete(participant)
+        # A single DELETE; there's nothing to load when the row only has to go
+        deleted = Participant.query.filter_by(user_id=user_id, playdate_id=playdate_id) \
+            .delete(synchronize_session=False)
+        if deleted:
             self.db.session.commit()
 
     def get_playdate_participants(self, playdate_id):
         """Get a list of participants for a specific playdate."""
-        playdate = Playdate.query.get(playdate_id)
+        playdate = self.db.session.get(Playdate, playdate_id,
+                                       options=[selectinload(Playdate.participants).joinedload(Participant.user)])
         return [participant.user for participant in playdate.participants] if playdate else []
 
     def get_location_coordinates(self, address: str, limit: int = 1):
+        """
+        Return latitude and longitude for a given place name, from the cache or from Mapbox.
+
+        Successful lookups are cached by the normalized address for GEOCODE_CACHE_TTL seconds and failed ones for
+        GEOCODE_FAILURE_TTL seconds. An expired successful entry is still returned if refreshing it fails.
+
+        :param address: The name of the place to geocode.
+        :param limit: Number of results to retrieve (default is 1).
+        :return: Tuple of (latitude, longitude) if successful, otherwise (None, None).
+        """
+        key = (' '.join(address.lower().split()), limit)
+        now = time.monotonic()
+        with self._geocode_cache_lock:
+            cached = self._geocode_cache.get(key)
+            if cached is not None:
+                self._geocode_cache.move_to_end(key)
+                coordinates, fetched_at = cached
+                ttl = GEOCODE_FAILURE_TTL if None in coordinates else GEOCODE_CACHE_TTL
+                if now - fetched_at < ttl:
+                    return coordinates
+
+        coordinates = self._fetch_location_coordinates(address, limit)
+        if None in coordinates and cached is not None and None not in cached[0]:
+            return cached[0]
+
+        with self._geocode_cache_lock:
+            self._geocode_cache[key] = (coordinates, now)
+            if len(self._geocode_cache) > GEOCODE_CACHE_SIZE:
+                self._geocode_cache.popitem(last=False)
+        return coordinates
+
+    def _fetch_location_coordinates(self, address: str, limit: int = 1):
         """
         Fetch latitude and longitude from Mapbox for a given place name.
 
@@ -128,12 +221,12 @@ class SQLiteSportBuddyDataManager(BaseModel, ABC):
         }
 
         try:
-            response = requests.get(url, params=params)
+            response = self._http.get(url, params=params, timeout=MAPBOX_TIMEOUT)
             response.raise_for_status()
             data = response.json()
 
             if not data.get('features'):
-                print(f"No geolocation data found for {address}.")
+                logger.info("No geolocation data found for %s.", address)
                 return None, None
 
             latitude = data['features'][0]['geometry']['coordinates'][1]
@@ -141,20 +234,34 @@ class SQLiteSportBuddyDataManager(BaseModel, ABC):
             return latitude, longitude
 
         except requests.RequestException as e:
-            print(f"Error fetching location for {address}: {e}")
+            logger.warning("Error fetching location for %s: %s", address, e)
             return None, None
         except KeyError:
-            print("Unexpected response structure from Mapbox.")
+            logger.warning("Unexpected response structure from Mapbox.")
             return None, None
 
+    def revoke_token(self, jti, expires_at):
+        """Record a revoked JWT until it expires, dropping rows of tokens that have expired since."""
+        self.db.session.query(RevokedToken).filter(RevokedToken.expires_at <= int(time.time())) \
+            .delete(synchronize_session=False)
+        self.db.session.execute(
+            sqlite_insert(RevokedToken).values(jti=jti, expires_at=expires_at).on_conflict_do_nothing()
+        )
+        self.db.session.commit()
+
+    def is_token_revoked(self, jti):
+        """Return True if a JWT has been revoked."""
+        return self.db.session.query(RevokedToken.jti).filter(RevokedToken.jti == jti).first() is not None
+
     def get_all_chat(self):
         return Chat.query.all()
 
     def get_chat_by_id(self, chat_id):
         """Get a chat by using its ID."""
-        return Chat.query.get(chat_id)
+        return self.db.session.get(Chat, chat_id)
 
     def add_chat(self, chat):
-        """Add a new user to the database."""
-        self.db.session.add(chat)
+        """Insert a new chat message from a dict of column values and return its ID."""
+        result = self.db.session.execute(insert(Chat).values(**chat))
         self.db.session.commit()
+        return result.inserted_primary_key[0]
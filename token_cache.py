@@ -0,0 +1,32 @@
+import threading
+import time
+
+
+class DecodedTokenCache:
+    """Claims of recently verified JWTs, so repeated Socket.IO events skip signature verification."""
+
+    def __init__(self, decode, maxsize=10000):
+        self._decode = decode
+        self._maxsize = maxsize
+        self._claims_by_token = {}
+        self._lock = threading.Lock()
+
+    def decode(self, token):
+        """Return the claims of a token, verifying it only if it isn't cached or has since expired."""
+        claims = self._claims_by_token.get(token)
+        if claims is not None and claims['exp'] > time.time():
+            return claims
+
+        claims = self._decode(token)
+        with self._lock:
+            if len(self._claims_by_token) >= self._maxsize:
+                self._prune(time.time())
+            self._claims_by_token[token] = claims
+        return claims
+
+    def _prune(self, now):
+        """Drop expired tokens, or everything if the cache is still full of live ones."""
+        self._claims_by_token = {token: claims for token, claims in self._claims_by_token.items()
+                                 if claims['exp'] > now}
+        if len(self._claims_by_token) >= self._maxsize:
+            self._claims_by_token.clear()